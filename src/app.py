@@ -7,22 +7,51 @@ for extracurricular activities at Mergington High School.
 
 from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse
+import asyncio
+from contextlib import asynccontextmanager, closing
 import os
 from pathlib import Path
 import sqlite3
 from typing import Dict, Any, List
 
+import aiosqlite
+from aiosqlitepool import SQLiteConnectionPool
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run one-time startup work (schema creation/bootstrap) per server, not per import."""
+    init_db()
+    yield
+
+
 app = FastAPI(title="Mergington High School API",
-              description="API for viewing and signing up for extracurricular activities")
+              description="API for viewing and signing up for extracurricular activities",
+              default_response_class=ORJSONResponse,
+              lifespan=lifespan)
 
-# Mount the static files directory
+# Mount the static files directory. html=True serves index.html for directory
+# requests; file bodies go out via FileResponse, which lets the server use
+# zero-copy sendfile.
 current_dir = Path(__file__).parent
-app.mount("/static", StaticFiles(directory=os.path.join(Path(__file__).parent,
-          "static")), name="static")
+app.mount("/static", StaticFiles(directory=current_dir / "static", html=True),
+          name="static")
 
-# SQLite DB path
+# SQLite DB location. DATABASE_PATH may be a plain path, ":memory:", or a
+# "file:" URI; ":memory:" is widened to a shared-cache URI so every pooled
+# connection sees the same data. In-memory mode skips all disk I/O, which is
+# what tests and ephemeral deployments want.
 DB_PATH = current_dir.parent.joinpath("data.db")
+DB_URI = os.environ.get("DATABASE_PATH", str(DB_PATH))
+if DB_URI == ":memory:":
+    DB_URI = "file::memory:?cache=shared"
+_DB_IS_URI = DB_URI.startswith("file:")
+_DB_IN_MEMORY = ":memory:" in DB_URI or "mode=memory" in DB_URI
+
+# Ensure the DB directory exists once at import rather than stat()-ing it on
+# every connection open
+if not _DB_IS_URI:
+    Path(DB_URI).parent.mkdir(parents=True, exist_ok=True)
 
 # Initial in-memory activities used to bootstrap the DB if empty
 INITIAL_ACTIVITIES: Dict[str, Dict[str, Any]] = {
@@ -83,163 +112,286 @@ INITIAL_ACTIVITIES: Dict[str, Dict[str, Any]] = {
 }
 
 
-def get_db_conn():
-    """Return a sqlite3 connection (creates DB file if necessary)."""
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    conn = sqlite3.connect(str(DB_PATH))
+# journal_mode=WAL persists in the DB file, so it only needs to be issued on
+# the first connection per process. Not applicable to in-memory databases.
+_wal_enabled = False
+
+# Number of long-lived connections kept in the pool, and how long an idle
+# connection may sit in it before being recycled.
+POOL_SIZE = 8
+POOL_IDLE_TIMEOUT = 3600
+
+
+async def _connection_factory() -> aiosqlite.Connection:
+    """Create one tuned aiosqlite connection for the pool."""
+    global _wal_enabled
+    conn = await aiosqlite.connect(DB_URI, cached_statements=256, uri=_DB_IS_URI)
     conn.row_factory = sqlite3.Row
+    if not _wal_enabled and not _DB_IN_MEMORY:
+        await conn.execute("PRAGMA journal_mode=WAL")
+        _wal_enabled = True
+    await conn.execute("PRAGMA synchronous=NORMAL")
+    await conn.execute("PRAGMA busy_timeout=5000")
+    await conn.execute("PRAGMA temp_store=MEMORY")
+    await conn.execute("PRAGMA cache_size=-20000")
     return conn
 
 
+pool = SQLiteConnectionPool(_connection_factory, pool_size=POOL_SIZE,
+                            idle_timeout=POOL_IDLE_TIMEOUT)
+
+# Hot-path SQL lifted to module constants so the per-connection prepared
+# statement cache (an LRU keyed on the SQL string) hits consistently.
+SQL_ACTIVITIES_WITH_PARTICIPANTS = (
+    "SELECT a.name, a.description, a.schedule, a.max_participants, p.email"
+    " FROM activities a LEFT JOIN participants p ON p.activity_name = a.name"
+    " ORDER BY a.name"
+)
+SQL_SIGNUP_INSERT = (
+    "INSERT INTO participants (activity_name, email)"
+    " SELECT a.name, ? FROM activities a WHERE a.name = ?"
+    " AND (a.max_participants IS NULL OR"
+    " (SELECT COUNT(*) FROM participants WHERE activity_name = a.name) < a.max_participants)"
+)
+SQL_UNREGISTER_DELETE = "DELETE FROM participants WHERE activity_name = ? AND email = ? RETURNING id"
+SQL_ACTIVITY_CAPACITIES = "SELECT name, max_participants FROM activities"
+SQL_PARTICIPANT_COUNTS = "SELECT activity_name, COUNT(*) AS c FROM participants GROUP BY activity_name"
+
+# Lazily-loaded per-activity capacity and participant counts, maintained on
+# mutation so the signup hot path can reject full activities with a dict
+# lookup instead of a COUNT aggregate. The capacity guard inside
+# SQL_SIGNUP_INSERT stays the source of truth; these only short-circuit
+# clear rejections. Updates happen on the single event loop between awaits,
+# so no lock is needed.
+_capacity: Dict[str, Any] = {}
+_counts: Dict[str, int] = {}
+_stats_loaded = False
+
+
+async def _load_activity_stats(conn: aiosqlite.Connection):
+    """Populate the capacity/count caches on first use (idempotent)."""
+    global _stats_loaded
+    if _stats_loaded:
+        return
+    cur = await conn.execute(SQL_ACTIVITY_CAPACITIES)
+    for row in await cur.fetchall():
+        _capacity[row["name"]] = row["max_participants"]
+        _counts.setdefault(row["name"], 0)
+    cur = await conn.execute(SQL_PARTICIPANT_COUNTS)
+    for row in await cur.fetchall():
+        _counts[row["activity_name"]] = row["c"]
+    _stats_loaded = True
+
+
+# Keeps the shared in-memory DB alive for the process lifetime (memory mode only)
+_memory_keepalive = None
+
+
 def init_db():
-    """Create tables and bootstrap initial activities if empty."""
-    conn = get_db_conn()
+    """Create tables and bootstrap initial activities if empty.
+
+    Runs once at startup before the event loop serves requests, so it
+    uses a plain one-shot sqlite3 connection rather than the async pool.
+    Short-circuits when another worker has already initialized the DB.
+    """
+    global _memory_keepalive
+    if _DB_IN_MEMORY:
+        # A shared-cache in-memory DB only lives while a connection holds it
+        # open, so keep the bootstrap connection for the process lifetime.
+        if _memory_keepalive is None:
+            _memory_keepalive = sqlite3.connect(DB_URI, uri=True)
+            _memory_keepalive.row_factory = sqlite3.Row
+            _init_db(_memory_keepalive)
+        return
+
+    if not _DB_IS_URI and Path(DB_URI).exists() and Path(DB_URI).stat().st_size > 0:
+        with closing(sqlite3.connect(DB_URI)) as conn:
+            try:
+                if conn.execute("SELECT 1 FROM activities LIMIT 1").fetchone():
+                    return
+            except sqlite3.OperationalError:
+                pass  # table missing; fall through to the full init
+
+    with closing(sqlite3.connect(DB_URI, uri=_DB_IS_URI)) as conn:
+        conn.row_factory = sqlite3.Row
+        _init_db(conn)
+
+
+def _init_db(conn: sqlite3.Connection):
     cur = conn.cursor()
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS activities (
-            name TEXT PRIMARY KEY,
-            description TEXT,
-            schedule TEXT,
-            max_participants INTEGER
+    # "with conn" commits on success and rolls back on exception
+    with conn:
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS activities (
+                name TEXT PRIMARY KEY,
+                description TEXT,
+                schedule TEXT,
+                max_participants INTEGER
+            )
+            """
         )
-        """
-    )
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS participants (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            activity_name TEXT,
-            email TEXT,
-            UNIQUE(activity_name, email)
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS participants (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                activity_name TEXT,
+                email TEXT,
+                UNIQUE(activity_name, email)
+            )
+            """
         )
-        """
-    )
-    conn.commit()
 
-    # If activities table is empty, insert initial activities
+    # If activities table is empty, insert initial activities in one batch
     cur.execute("SELECT COUNT(*) as c FROM activities")
     row = cur.fetchone()
     if row and row["c"] == 0:
-        for name, data in INITIAL_ACTIVITIES.items():
-            cur.execute(
-                "INSERT INTO activities (name, description, schedule, max_participants) VALUES (?, ?, ?, ?)",
-                (name, data["description"], data["schedule"], data["max_participants"]),
-            )
-            for email in data.get("participants", []):
-                try:
-                    cur.execute(
-                        "INSERT INTO participants (activity_name, email) VALUES (?, ?)",
-                        (name, email),
-                    )
-                except sqlite3.IntegrityError:
-                    pass
-        conn.commit()
+        acts = [
+            (name, data["description"], data["schedule"], data["max_participants"])
+            for name, data in INITIAL_ACTIVITIES.items()
+        ]
+        parts = [
+            (name, email)
+            for name, data in INITIAL_ACTIVITIES.items()
+            for email in data.get("participants", [])
+        ]
+        # Single transaction, and a single multi-VALUES statement per table so
+        # the whole bootstrap compiles to two statements and one commit
+        with conn:
+            if acts:
+                cur.execute(
+                    "INSERT OR IGNORE INTO activities (name, description, schedule, max_participants) VALUES "
+                    + ", ".join(["(?, ?, ?, ?)"] * len(acts)),
+                    [value for act in acts for value in act],
+                )
+            if parts:
+                cur.execute(
+                    "INSERT OR IGNORE INTO participants (activity_name, email) VALUES "
+                    + ", ".join(["(?, ?)"] * len(parts)),
+                    [value for part in parts for value in part],
+                )
+
+
+# The "/" redirect never changes, so build the response once and reuse it
+_ROOT_REDIRECT = RedirectResponse(url="/static/index.html")
 
-    conn.close()
 
+@app.get("/")
+def root():
+    return _ROOT_REDIRECT
 
-# Initialize DB on import/start
-init_db()
 
+# Cached /activities payload, served until a signup/unregister bumps the data
+# version. The lock only serializes cache rebuilds, not cache hits.
+_data_version = 0
+_cache_version = -1
+_cache_payload: Dict[str, Any] = {}
+_cache_lock = asyncio.Lock()
 
-@app.get("/")
-def root():
-    return RedirectResponse(url="/static/index.html")
 
+def _bump_data_version():
+    """Invalidate the /activities cache after a successful mutation."""
+    global _data_version
+    _data_version += 1
 
-def build_activity_dict(rows: List[sqlite3.Row]) -> Dict[str, Any]:
-    """Helper to build activity dict from DB rows."""
+
+def build_activity_dict(rows: List[tuple]) -> Dict[str, Any]:
+    """Helper to build activity dict from activity/participant LEFT JOIN tuples."""
     result: Dict[str, Any] = {}
-    for r in rows:
-        name = r["name"]
-        result[name] = {
-            "description": r["description"],
-            "schedule": r["schedule"],
-            "max_participants": r["max_participants"],
-            "participants": []
-        }
+    for name, description, schedule, max_participants, email in rows:
+        entry = result.get(name)
+        if entry is None:
+            entry = result[name] = {
+                "description": description,
+                "schedule": schedule,
+                "max_participants": max_participants,
+                "participants": []
+            }
+        if email is not None:
+            entry["participants"].append(email)
     return result
 
 
 @app.get("/activities")
-def get_activities():
-    conn = get_db_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT name, description, schedule, max_participants FROM activities")
-    activities = build_activity_dict(cur.fetchall())
-
-    # Load participants
-    cur.execute("SELECT activity_name, email FROM participants")
-    for row in cur.fetchall():
-        aname = row["activity_name"]
-        if aname in activities:
-            activities[aname]["participants"].append(row["email"])
+async def get_activities():
+    global _cache_version, _cache_payload
+    if _cache_version == _data_version:
+        return _cache_payload
+
+    async with _cache_lock:
+        # Another task may have rebuilt the cache while we waited on the lock
+        if _cache_version == _data_version:
+            return _cache_payload
+
+        # Snapshot before querying so a concurrent mutation forces a refetch
+        version = _data_version
+        async with pool.connection() as conn:
+            # One pass: activities and their participants in a single indexed join.
+            # Plain tuples for this cursor: positional unpacking beats per-field
+            # sqlite3.Row lookups on the widest query in the app.
+            cur = await conn.execute(SQL_ACTIVITIES_WITH_PARTICIPANTS)
+            cur.row_factory = None
+            activities = build_activity_dict(await cur.fetchall())
+
+        _cache_payload, _cache_version = activities, version
 
-    conn.close()
     return activities
 
 
 @app.post("/activities/{activity_name}/signup")
-def signup_for_activity(activity_name: str, email: str):
+async def signup_for_activity(activity_name: str, email: str):
     """Sign up a student for an activity (persisted to SQLite)."""
-    conn = get_db_conn()
-    cur = conn.cursor()
-
-    # Validate activity exists
-    cur.execute("SELECT max_participants FROM activities WHERE name = ?", (activity_name,))
-    row = cur.fetchone()
-    if not row:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Activity not found")
-
-    max_p = row["max_participants"]
-
-    # Check if already signed up
-    cur.execute("SELECT 1 FROM participants WHERE activity_name = ? AND email = ?", (activity_name, email))
-    if cur.fetchone():
-        conn.close()
-        raise HTTPException(status_code=400, detail="Student is already signed up")
-
-    # Enforce capacity
-    cur.execute("SELECT COUNT(*) as c FROM participants WHERE activity_name = ?", (activity_name,))
-    count = cur.fetchone()["c"]
-    if max_p is not None and count >= max_p:
-        conn.close()
-        raise HTTPException(status_code=400, detail="Activity is full")
-
-    # Insert participant
-    try:
-        cur.execute("INSERT INTO participants (activity_name, email) VALUES (?, ?)", (activity_name, email))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        conn.close()
-        raise HTTPException(status_code=400, detail="Student is already signed up")
-
-    conn.close()
+    async with pool.connection() as conn:
+        await _load_activity_stats(conn)
+
+        # Validate activity exists from the cached name map (activities are
+        # read-only after bootstrap), then reject a full one — all without SQL
+        if activity_name not in _capacity:
+            raise HTTPException(status_code=404, detail="Activity not found")
+        max_p = _capacity[activity_name]
+        if max_p is not None and _counts.get(activity_name, 0) >= max_p:
+            raise HTTPException(status_code=400, detail="Activity is full")
+
+        # One atomic statement: insert only if the activity exists and has room
+        # (a NULL max_participants means unlimited). Closes the check-then-insert
+        # race on capacity under concurrent signups.
+        try:
+            cur = await conn.execute(SQL_SIGNUP_INSERT, (email, activity_name))
+            await conn.commit()
+        except sqlite3.IntegrityError:
+            # Roll back so the pooled connection is not returned mid-transaction
+            await conn.rollback()
+            raise HTTPException(status_code=400, detail="Student is already signed up")
+
+        if cur.rowcount == 0:
+            # Existence was checked above, so the only remaining cause is capacity
+            raise HTTPException(status_code=400, detail="Activity is full")
+
+        _counts[activity_name] = _counts.get(activity_name, 0) + 1
+
+    _bump_data_version()
     return {"message": f"Signed up {email} for {activity_name}"}
 
 
 @app.delete("/activities/{activity_name}/unregister")
-def unregister_from_activity(activity_name: str, email: str):
+async def unregister_from_activity(activity_name: str, email: str):
     """Unregister a student from an activity (persisted to SQLite)."""
-    conn = get_db_conn()
-    cur = conn.cursor()
+    async with pool.connection() as conn:
+        await _load_activity_stats(conn)
 
-    # Validate activity exists
-    cur.execute("SELECT 1 FROM activities WHERE name = ?", (activity_name,))
-    if not cur.fetchone():
-        conn.close()
-        raise HTTPException(status_code=404, detail="Activity not found")
+        # Validate activity exists from the cached name map
+        if activity_name not in _capacity:
+            raise HTTPException(status_code=404, detail="Activity not found")
 
-    # Validate student is signed up
-    cur.execute("SELECT id FROM participants WHERE activity_name = ? AND email = ?", (activity_name, email))
-    row = cur.fetchone()
-    if not row:
-        conn.close()
-        raise HTTPException(status_code=400, detail="Student is not signed up for this activity")
+        # Validate-and-delete in one atomic statement (DELETE ... RETURNING)
+        cur = await conn.execute(SQL_UNREGISTER_DELETE, (activity_name, email))
+        deleted = await cur.fetchone()
+        await conn.commit()
+        if deleted is None:
+            raise HTTPException(status_code=400, detail="Student is not signed up for this activity")
+
+        if activity_name in _counts:
+            _counts[activity_name] = max(0, _counts[activity_name] - 1)
 
-    cur.execute("DELETE FROM participants WHERE id = ?", (row["id"],))
-    conn.commit()
-    conn.close()
+    _bump_data_version()
     return {"message": f"Unregistered {email} from {activity_name}"}